@@ -1,261 +1,613 @@
 import os
-import json
+import re
+import fcntl
+import tempfile
+from contextlib import contextmanager
+import orjson
 import hashlib
 import requests
-import xml.etree.ElementTree as ET
+from requests.adapters import HTTPAdapter
+from lxml import etree
 from datetime import datetime, timezone, timedelta
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 from dotenv import load_dotenv
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
 import io
-from PIL import Image
+from PIL import Image, features
+import tiktoken
 
 from xai_sdk import Client
 from xai_sdk.chat import user, system
 
 NUM_ARTICLES = 1
-MAX_ARTICLE_CHARS = 100000
+MAX_ARTICLE_TOKENS = 8000
+# Rough English chars-per-token ratio, used when the tokenizer can't be loaded
+CHARS_PER_TOKEN = 4
 RSS_BBC_US = "https://feeds.bbci.co.uk/news/world/us_and_canada/rss.xml"
+MAX_FETCH_WORKERS = 8
+MAX_IMAGE_BYTES = 1_000_000
+MIN_JPEG_QUALITY = 30
 
 # Load environment variables from .env file in the backend directory
 BASE_DIR = os.path.dirname(__file__)
 NEWS_OUTPUT_DIR = os.path.join(BASE_DIR, "..", "frontend", "public", "news")
 NEWS_THUMBNAILS_DIR = os.path.join(BASE_DIR, "..", "frontend", "public", "thumbnails")
+DEDUP_INDEX_PATH = os.path.join(BASE_DIR, "dedup_index.jsonl")
+# Stable path to flock around index appends and rewrites (the index itself is replaced)
+DEDUP_INDEX_LOCK_PATH = os.path.join(BASE_DIR, "dedup_index.lock")
+DEDUP_LOCK_DIR = os.path.join(BASE_DIR, ".locks")
+# Claims only guard runs in flight (saved articles are in the dedup index), so a lock
+# older than the longest possible run was left behind by a killed process
+DEDUP_LOCK_MAX_AGE = timedelta(hours=6)
+
+# Anything other than letters, digits, spaces, hyphens and underscores is stripped from filenames
+UNSAFE_FILENAME_CHARS = re.compile(r"[^\w \-]")
+
+# cl100k_base approximates Grok's tokenizer for budgeting. tiktoken downloads it on first
+# use, so it is loaded lazily by get_article_encoding() and may be unavailable offline.
+_ARTICLE_ENCODING = None
+_ARTICLE_ENCODING_LOADED = False
+_ARTICLE_ENCODING_LOCK = Lock()
+
+# Shared xAI client so every call reuses one gRPC channel; created lazily by get_client()
+_CLIENT: Client | None = None
+_CLIENT_LOCK = Lock()
+
+RSS_PARSER = etree.XMLParser(resolve_entities=False, no_network=True)
+RSS_ITEM_XPATH = etree.XPath(".//item")
 
 env_path = os.path.join(BASE_DIR, ".env")
 load_dotenv(env_path)
 
+# Kept byte-identical across requests so Grok can reuse its cached prefix
+EMOJIPASTA_SYSTEM_PROMPT = """
+    You are a text transformation assistant that converts news articles into emojipasta format. You must respond with valid JSON only, no additional text or explanations.
+
+    Example emojipasta style (the below example is short. Yours should be longer):
+    Wall 🧱 Street 🤑📉 Cucks 🐔💸 were SWEATING 😰💦 over AI 🤖 BUBBLE 🫧 POP 💥 but NVDA 🟢🔥 just DROPPED the MIC 🎤🍆! Revenue for Q3 📊 to October 🗓️ jumped 🐸 62% 🚀📈 to a THICC $57BN 💰🍑 – that's AI data center chips 🖥️🤖 going BRRRRR 😩💨, with that division ➗ SLAYING 🔪 66% to $51BN+ 🤯💦! Q4 forecast? $65BN EASY PEASY 🍆🍌 TOPPING estimates like Jensen's leather 🐄 jacket 🧥😍 at a tech rave 👾! Shares POPPED 4% after hours 🌙📈 cuz MOMMY NVDA 👩‍🍼💰 is the WORLD'S RICHEST DADDY 👑🤑 worth TRILLIONS ‼️\n
+    Jensen Huang 🕶️👨‍💼 dropping BOMBS 💣📢: 'AI BLACKWELL ⚫️👍 SYSTEMS OFF THE CHARTS 📊🔥 CLOUD ⛈️ GPUS SOLD OUT 🎰🚫!' No bubble here bby 👼🐣, we EXCEL 📈😤 at EVERY PHASE of AI – from TRAINING 🏋️‍♂️🤖 to INFERENCING 🧠💨! Wall Street simps 🤡📱 were WOKE AF about OVERVALUED HYPE 😱 but NVDA said 'HOLD MY TSMC 🏭🍆' and BEAT by a MILE 🏃‍♂️💨! S&P dipped 3% in Nov 📉😢 but Jensen's got that MAGIC WAND 🪄🍆 fixing markets 💹 like Elon fixes Twitter 🚀🐦!\n
+    CFO Colette Kress 💅📈 spilling tea ☕: MORE ORDERS on top of $500BN 🤑 AI CHIP BACKLOG 📦 – but salty 🧂😣 about CHINA EXPORT BANS 🚫🇨🇳, 'US 🇺🇸 gotta WIN EVERY DEV 🧑‍💻🌍!' Meanwhile, ⏰ JENSEN + ELON MUSK 🐦🚀 teaming 👫 up ⬆️ at US-SAUDI FORUM 🤝🏜️ for MASSIVE DATA 💽 CENTER 🖥️🏰 in SAUDI with xAI as FIRST CUCK... er, CUSTOMER 👀💦! Hundreds of THOUSANDS 😳 Nvidia chips 🚀🖥️ approved by Trump-MBS BROKERED DEAL ✋🇺🇸🇸🇦 – WSJ spilling the deets! 📰🔥\n
+    META ZUCK 🤖💰, ALPHABET 🔠 PICHai 🧔📱, MSFT SATYA 👨‍💼 dumping BILLIONS 🤑 on AI DATA CENTERS 🖥️ – Sundar called it 'IRRATIONAL BOOM' 😂🤑 but NVDA at the HEART ❤️🔥 of OPENAI SAM ALTMAN 🤖💋, ANTHROPIC 👽, xAI deals! Circular INVESTMENTS 🔄💰 like NVDA's $100BN in GPT DADDY 😍🍆 – it's an AI ORGY 💦👯‍♂️ where EVERYONE'S CUMMING 💨📈 to record highs 🍃😍!\n
+    Adam Turnquist & Matt Britzman simping HARD 🤤: 'Not IF Nvidia beats 🫜, but BY HOW MUCH 🍆📏!' NVDA not BREATHING 📉, it's THRUSTING ⬆️😩!
+                               
+    Example emojipasta headlines:
+    Original: Nvidia shares rise after strong results ease 'AI bubble' concerns
+    Emojipasta: Jensen Huang 🕶️👨‍💼 MOONS CROWD 🍑🚀 with NVDA $57B 🤑 AI ORGY 💥📈‼️
+
+    Original: Trump Signs Bill to Release Epstein Files Within 30 Days
+    Empojipasta: Trump 🍊👨 OKs 👌 Epstein BOMB DROP 💣📜 - Ghislaine's GUEST LIST GOOSED 🍆🕺
+
+    Original: Trump ally Marjorie Taylor Greene to quit Congress after Epstein files feud
+    Emojipasta MTG RAGE-QUITS 🍑💥 Trump's Epstein Cover-Up 🛌 and Cucks Her Seat 😩🔒
+
+    [IMPORTANT] The headline shall be kept short, ideally under 10 words. Puns and word play are highly encouraged.
+
+    You will be given one or more numbered articles. You must output valid JSON with exactly one entry in "results" per article, in the same order, each echoing its article number:
+    {
+        "results": [
+            {
+                "article": 1,
+                "headline": "emojipasta version of the article title",
+                "text": "full article content in emojipasta format"
+            }
+        ]
+    }
+    """
+
+
+def get_client() -> Client:
+    """
+    Return the process-wide xAI client, creating it on first use.
+    The client wraps a thread-safe gRPC channel, so it is shared across worker threads.
+    """
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = Client(api_key=os.getenv("XAI_API_KEY"), timeout=3600)
+        return _CLIENT
+
+
+def make_safe_title(title: str) -> str:
+    """
+    Create a safe filename stem from an article title, shared by the JSON and thumbnail files.
+    """
+    return UNSAFE_FILENAME_CHARS.sub("", title).rstrip().replace(" ", "_")[:50]  # Limit length
+
 
 def hash_article_id(raw_id: str, secret: str) -> str:
+    # SHA-256 stays deliberately: payloads are ~100 bytes hashed once per RSS item, so the
+    # digest cost is noise, and the hashes are persisted in published article JSON and the
+    # dedup index, so changing the algorithm would break dedup across the window.
     payload = f"{secret}:{raw_id}".encode("utf-8")
     return hashlib.sha256(payload).hexdigest()
 
 
-def load_recent_article_hashes(days: int = 7) -> set[str]:
+def parse_article_date(date_str: str) -> datetime | None:
+    try:
+        dt = datetime.fromisoformat(date_str)
+    except ValueError:
+        return None
+
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def claim_article_hash(hashed_id: str) -> bool:
+    """
+    Atomically claim a hashed article ID by creating its lock file with O_EXCL.
+    Returns False if another thread or process already claimed it.
+    """
+    os.makedirs(DEDUP_LOCK_DIR, exist_ok=True)
+    try:
+        fd = os.open(os.path.join(DEDUP_LOCK_DIR, hashed_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.close(fd)
+    return True
+
+
+def release_article_hash(hashed_id: str) -> None:
+    try:
+        os.remove(os.path.join(DEDUP_LOCK_DIR, hashed_id))
+    except FileNotFoundError:
+        pass
+
+
+def prune_article_locks() -> None:
+    """
+    Remove lock files older than DEDUP_LOCK_MAX_AGE, e.g. from a run that was killed.
+    """
+    if not os.path.isdir(DEDUP_LOCK_DIR):
+        return
+
+    cutoff_ts = (datetime.now(timezone.utc) - DEDUP_LOCK_MAX_AGE).timestamp()
+    for dir_entry in os.scandir(DEDUP_LOCK_DIR):
+        try:
+            if dir_entry.stat().st_mtime < cutoff_ts:
+                os.remove(dir_entry.path)
+        except OSError as exc:
+            print(f"Skipped pruning {dir_entry.path}: {exc}")
+
+
+@contextmanager
+def dedup_index_lock():
+    """
+    Hold an exclusive lock on the dedup index across threads and overlapping runs.
+    """
+    with open(DEDUP_INDEX_LOCK_PATH, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def append_dedup_index(hashed_id: str, date_str: str) -> None:
+    with dedup_index_lock(), open(DEDUP_INDEX_PATH, "ab") as f:
+        f.write(orjson.dumps({"hash": hashed_id, "date": date_str}) + b"\n")
+
+
+def scan_article_hashes(cutoff: datetime) -> list[dict]:
+    """
+    Read hash/date pairs from every saved article JSON newer than cutoff.
+    Only used to seed the dedup index when it doesn't exist yet.
+    """
     if not os.path.isdir(NEWS_OUTPUT_DIR):
-        return set()
+        return []
 
-    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-    hashes: set[str] = set()
+    entries: list[dict] = []
+    cutoff_ts = cutoff.timestamp()
 
-    for filename in os.listdir(NEWS_OUTPUT_DIR):
+    for dir_entry in os.scandir(NEWS_OUTPUT_DIR):
+        filename = dir_entry.name
         if not filename.endswith(".json") or filename == "index.json":
             continue
 
-        filepath = os.path.join(NEWS_OUTPUT_DIR, filename)
+        filepath = dir_entry.path
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # A file last written before the cutoff can't hold a recent article
+            if dir_entry.stat().st_mtime < cutoff_ts:
+                continue
+
+            with open(filepath, 'rb') as f:
+                data = orjson.loads(f.read())
 
             hashed_id = data.get("article_id")
             date_str = data.get("date")
             if not hashed_id or not date_str:
                 continue
 
-            try:
-                dt = datetime.fromisoformat(date_str)
-            except ValueError:
-                continue
-
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-
-            if dt >= cutoff:
-                hashes.add(hashed_id)
+            dt = parse_article_date(date_str)
+            if dt is not None and dt >= cutoff:
+                entries.append({"hash": hashed_id, "date": date_str})
         except Exception as exc:
             print(f"Skipped reading {filepath}: {exc}")
 
-    return hashes
+    return entries
+
+
+def load_recent_article_hashes(days: int = 7) -> set[str]:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
 
-def fetch_news_articles(num_articles=1):
+    # Read and rewrite under one lock so no append from another run lands in between
+    with dedup_index_lock():
+        return read_and_compact_dedup_index(cutoff)
+
+
+def read_and_compact_dedup_index(cutoff: datetime) -> set[str]:
+    if os.path.exists(DEDUP_INDEX_PATH):
+        entries: list[dict] = []
+        stale = False
+
+        with open(DEDUP_INDEX_PATH, "rb") as f:
+            for line in f:
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    print(f"Dropping unreadable dedup index line: {line[:100]!r}")
+                    stale = True
+                    continue
+
+                hashed_id = entry.get("hash")
+                date_str = entry.get("date")
+                dt = parse_article_date(date_str) if hashed_id and date_str else None
+                if dt is not None and dt >= cutoff:
+                    entries.append(entry)
+                else:
+                    stale = True
+    else:
+        # Seed the index from the saved articles once; later runs only read the index
+        entries = scan_article_hashes(cutoff)
+        stale = True
+
+    # Rewrite the index without aged-out entries so it stays proportional to the window
+    if stale:
+        fd, tmp_path = tempfile.mkstemp(dir=BASE_DIR, prefix="dedup_index.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for entry in entries:
+                    f.write(orjson.dumps({"hash": entry["hash"], "date": entry["date"]}) + b"\n")
+            os.replace(tmp_path, DEDUP_INDEX_PATH)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    return {entry["hash"] for entry in entries}
+
+
+def create_http_session():
+    """
+    Create a requests session with a connection pool large enough for parallel fetches.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_full_article(session, entry):
+    """
+    Fetch and extract the full text of a single RSS entry.
+    Falls back to the RSS description if the article page cannot be fetched.
+    """
+    title = entry["title"]
+    description = entry["description"]
+    link = entry["link"]
+
+    try:
+        # Fetch the full article page
+        article_response = session.get(link)
+        article_response.raise_for_status()
+
+        # Parse the article page to extract content
+        tree = LexborHTMLParser(article_response.text)
+
+        # BBC articles use specific tags for content
+        article_paragraphs = []
+
+        # Try to find article body paragraphs
+        article_body = tree.css_first("article")
+        if article_body:
+            paragraphs = article_body.css("p")
+            article_paragraphs = [text for p in paragraphs if (text := p.text().strip())]
+
+        # Fallback: try data-component="text-block"
+        if not article_paragraphs:
+            text_blocks = tree.css('[data-component="text-block"]')
+            article_paragraphs = [text for block in text_blocks if (text := block.text().strip())]
+
+        # Combine all content
+        full_article = "\n\n".join(article_paragraphs) if article_paragraphs else description
+
+        # Combine title, description, and full content
+        article_text = f"""Title: {title}
+
+{description}
+
+{full_article}"""
+
+    except Exception as e:
+        print(f"Error fetching article '{title}': {e}")
+        # Add basic info even if full content fetch fails
+        article_text = f"""Title: {title}
+
+{description}"""
+
+    return {**entry, "content": article_text}
+
+
+def fetch_news_articles(num_articles=1, hash_key=None, recent_hashes=None):
     """
     Fetch the top news articles from BBC RSS feed.
+    Items whose hashed ID is in recent_hashes (or repeats within the feed) are skipped
+    before their article page is downloaded, as are items another run has claimed.
+    Every returned article with a hashed_id holds its claim; the caller must release it
+    if the article doesn't get saved.
     Returns a list of article data dictionaries with title, description, link, and content.
     """
+    session = create_http_session()
+
     # Fetch BBC RSS feed
     rss_url = RSS_BBC_US
-    response = requests.get(rss_url)
+    response = session.get(rss_url)
     response.raise_for_status()
 
     # Parse XML
-    root = ET.fromstring(response.content)
+    root = etree.fromstring(response.content, RSS_PARSER)
 
     # Find all items
-    items = root.findall('.//item')
+    items = RSS_ITEM_XPATH(root)
     if not items:
         raise ValueError("No articles found in RSS feed")
 
-    articles = []
+    prune_article_locks()
+    seen_hashes = set(recent_hashes or ())
+    entries = []
     for i, item in enumerate(items[:num_articles]):
-        title = item.find('title').text
-        description = item.find('description').text
-        link = item.find('link').text
-        guid_text = item.find('guid').text if item.find('guid') is not None else None
+        title = item.findtext('title')
+        description = item.findtext('description')
+        link = item.findtext('link')
+        guid_text = item.findtext('guid')
         article_id = guid_text.split('#')[0] if guid_text else None
 
-        print(f"Fetching article {i+1}/{num_articles}: {title}")
-
-        try:
-            # Fetch the full article page
-            article_response = requests.get(link)
-            article_response.raise_for_status()
-
-            # Parse the article page to extract content
-            soup = BeautifulSoup(article_response.text, "html.parser")
-
-            # BBC articles use specific tags for content
-            article_paragraphs = []
-
-            # Try to find article body paragraphs
-            article_body = soup.find("article")
-            if article_body:
-                paragraphs = article_body.find_all("p")
-                article_paragraphs = [p.get_text().strip() for p in paragraphs if p.get_text().strip()]
-
-            # Fallback: try data-component="text-block"
-            if not article_paragraphs:
-                text_blocks = soup.find_all(attrs={"data-component": "text-block"})
-                article_paragraphs = [block.get_text().strip() for block in text_blocks if block.get_text().strip()]
-
-            # Combine all content
-            full_article = "\n\n".join(article_paragraphs) if article_paragraphs else description
-
-            # Combine title, description, and full content
-            article_text = f"""Title: {title}
-
-{description}
+        hashed_id = None
+        if article_id and hash_key:
+            hashed_id = hash_article_id(article_id, hash_key)
+            if hashed_id in seen_hashes:
+                print(f"Skipping '{title}' (duplicate article hash).")
+                continue
+            seen_hashes.add(hashed_id)
+            # Claim before any fetch, LLM or image work so overlapping runs don't repeat it
+            if not claim_article_hash(hashed_id):
+                print(f"Skipping '{title}' (claimed by another run).")
+                continue
 
-{full_article}"""
+        print(f"Fetching article {i+1}/{num_articles}: {title}")
 
-            articles.append(
-                {
-                    "title": title,
-                    "description": description,
-                    "link": link,
-                    "content": article_text,
-                    "article_id": article_id,
-                }
-            )
+        entries.append(
+            {
+                "title": title,
+                "description": description,
+                "link": link,
+                "article_id": article_id,
+                "hashed_id": hashed_id,
+            }
+        )
 
-        except Exception as e:
-            print(f"Error fetching article '{title}': {e}")
-            # Add basic info even if full content fetch fails
-            articles.append(
-                {
-                    "title": title,
-                    "description": description,
-                    "link": link,
-                    "content": f"""Title: {title}
-
-{description}""",
-                    "article_id": article_id,
-                }
-            )
+    # Fetch all article pages concurrently over the shared connection pool
+    with session, ThreadPoolExecutor(max_workers=max(1, min(len(entries), MAX_FETCH_WORKERS))) as executor:
+        articles = list(executor.map(lambda entry: fetch_full_article(session, entry), entries))
 
     return articles
 
 
-def process_single_article(article_data, hash_key, known_hashes, hashes_lock):
+def process_single_article(article_data, emojipasta_data, timestamp, image_future):
     """
-    Process a single article: convert to emojipasta and save to JSON.
-    Returns the filename of the saved JSON file or None if skipped.
+    Process a single converted article: attach its thumbnail and save to JSON.
+    `image_future` is the already-running thumbnail generation for this article,
+    whose hashed ID was claimed by fetch_news_articles.
+    Returns the filename of the saved JSON file.
     """
-    article_text = article_data["content"]
-    original_title = article_data["title"]
-    raw_article_id = article_data.get("article_id")
-
-    hashed_id = None
-    if raw_article_id and hash_key:
-        hashed_id = hash_article_id(raw_article_id, hash_key)
-        with hashes_lock:
-            if hashed_id in known_hashes:
-                print(f"Skipping '{original_title}' (duplicate article hash).")
-                return None
-
-    print(f"Converting article to emojipasta: {original_title}")
-
-    # Convert to emojipasta
-    print(f"  > Sending text to Grok for conversion... ({original_title})")
-    emojipasta_data = convert_to_emojipasta(article_text, original_title)
+    hashed_id = article_data.get("hashed_id")
 
     if hashed_id:
         emojipasta_data["article_id"] = hashed_id
 
-    timestamp = datetime.now(timezone.utc)
     emojipasta_data["date"] = str(timestamp)
     timestamp_str = timestamp.strftime("%Y%m%d_%H%M%S")
 
-    print(f"  > Generating thumbnail image... ({original_title})")
-    image_filename = generate_and_save_image(emojipasta_data, original_title, timestamp_str)
-    if image_filename:
-        emojipasta_data["image"] = os.path.basename(image_filename)
-        print(f"  > Image saved: {os.path.basename(image_filename)}")
-    else:
-        print("  > Image generation failed or skipped.")
-
-    # Save to JSON
-    filename = save_emojipasta_json(emojipasta_data, original_title, timestamp_str)
+    image_filename = image_future.result()
+    try:
+        if image_filename:
+            emojipasta_data["image"] = os.path.basename(image_filename)
+            print(f"  > Image saved: {os.path.basename(image_filename)}")
+        else:
+            print("  > Image generation failed or skipped.")
+
+        # Save to JSON
+        filename = save_emojipasta_json(emojipasta_data, article_data["safe_title"], timestamp_str)
+    except Exception:
+        # Let a later run retry the article from scratch
+        if image_filename and os.path.exists(image_filename):
+            os.remove(image_filename)
+        if hashed_id:
+            release_article_hash(hashed_id)
+        raise
 
     if hashed_id:
-        with hashes_lock:
-            known_hashes.add(hashed_id)
+        append_dedup_index(hashed_id, emojipasta_data["date"])
 
     print(f"Saved: {filename}")
     return filename
 
-def convert_to_emojipasta(article_text, original_title):
+
+def get_article_encoding():
+    """
+    Return the tiktoken encoding used for article budgets, or None if it can't be loaded.
+    The load is attempted once per process.
+    """
+    global _ARTICLE_ENCODING, _ARTICLE_ENCODING_LOADED
+    with _ARTICLE_ENCODING_LOCK:
+        if not _ARTICLE_ENCODING_LOADED:
+            _ARTICLE_ENCODING_LOADED = True
+            try:
+                _ARTICLE_ENCODING = tiktoken.get_encoding("cl100k_base")
+            except Exception as exc:
+                print(f"Could not load tokenizer; falling back to a character budget: {exc}")
+        return _ARTICLE_ENCODING
+
+
+def truncate_article_text(article_text):
     """
-    Use Grok to convert article text to emojipasta format and return structured JSON.
-    Retries up to 10 times if JSON parsing fails.
+    Truncate very long articles to keep token usage bounded.
+    """
+    encoding = get_article_encoding()
+    if encoding is None:
+        max_chars = MAX_ARTICLE_TOKENS * CHARS_PER_TOKEN
+        if len(article_text) <= max_chars:
+            return article_text
+        truncated = article_text[:max_chars]
+    else:
+        # encode_ordinary treats special-token strings like <|endoftext|> as plain text
+        tokens = encoding.encode_ordinary(article_text)
+        if len(tokens) <= MAX_ARTICLE_TOKENS:
+            return article_text
+        truncated = encoding.decode(tokens[:MAX_ARTICLE_TOKENS])
+
+    # Try to cut on a paragraph boundary for readability
+    last_break = truncated.rfind("\n\n")
+    if last_break > 0:
+        truncated = truncated[:last_break]
+    return truncated + "\n\n[TRUNCATED]"
+
+
+class JsonStreamScanner:
+    """
+    Track JSON structure across streamed chunks so every character is scanned once.
+    Objects nested at ITEM_DEPTH (the entries of the "results" array) are decoded
+    and returned by feed() as soon as they close.
+    """
+
+    ITEM_DEPTH = 3
+
+    def __init__(self):
+        self.chunks = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.started = False
+        self.complete = False
+        self._item_parts = None
+
+    @property
+    def text(self):
+        return "".join(self.chunks)
+
+    def feed(self, delta):
+        """
+        Scan a streamed chunk and return the list of result objects it completed.
+        Raises orjson.JSONDecodeError as soon as the response is clearly not a JSON object.
+        """
+        self.chunks.append(delta)
+        completed = []
+        item_start = 0 if self._item_parts is not None else None
+
+        for i, ch in enumerate(delta):
+            if not self.started:
+                if ch.isspace():
+                    continue
+                if ch != "{":
+                    raise orjson.JSONDecodeError("Response does not start with a JSON object", self.text, 0)
+                self.started = True
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+                if ch == "{" and self.depth == self.ITEM_DEPTH:
+                    self._item_parts = []
+                    item_start = i
+            elif ch in "}]":
+                if ch == "}" and self.depth == self.ITEM_DEPTH and self._item_parts is not None:
+                    self._item_parts.append(delta[item_start : i + 1])
+                    completed.append(orjson.loads("".join(self._item_parts)))
+                    self._item_parts = None
+                    item_start = None
+                self.depth -= 1
+                if self.depth == 0:
+                    self.complete = True
+
+        if self._item_parts is not None:
+            self._item_parts.append(delta[item_start:])
+
+        return completed
+
+
+def convert_batch_to_emojipasta(articles, on_result=None):
+    """
+    Use Grok to convert all articles to emojipasta format in a single request.
+    Returns a list of {"headline", "text"} dicts aligned with `articles`, or None
+    if some article never got a result. If given, on_result(index, result) is called
+    for each article as soon as its result has streamed in, at most once per article.
     """
     api_key = os.getenv("XAI_API_KEY")
     if not api_key:
         raise ValueError("XAI_API_KEY environment variable is not set")
 
-    client = Client(
-        api_key=api_key,
-        timeout=3600,
-    )
+    client = get_client()
 
     # Keep retries small to avoid repeated large requests
     max_retries = 3
-
-    for attempt in range(max_retries):
+    scanner = JsonStreamScanner()
+    collected = {}
+
+    def emit(item):
+        """
+        Hand off a streamed result by the article number the model echoed back, so a
+        dropped or merged article can't shift later results onto the wrong article.
+        """
+        if not isinstance(item, dict) or "headline" not in item or "text" not in item:
+            return
         try:
-            chat = client.chat.create(model="grok-4-1-fast-non-reasoning")
-            chat.append(
-                system(
-                    """
-    You are a text transformation assistant that converts news articles into emojipasta format. You must respond with valid JSON only, no additional text or explanations.
-
-    Example emojipasta style (the below example is short. Yours should be longer):
-    Wall 🧱 Street 🤑📉 Cucks 🐔💸 were SWEATING 😰💦 over AI 🤖 BUBBLE 🫧 POP 💥 but NVDA 🟢🔥 just DROPPED the MIC 🎤🍆! Revenue for Q3 📊 to October 🗓️ jumped 🐸 62% 🚀📈 to a THICC $57BN 💰🍑 – that's AI data center chips 🖥️🤖 going BRRRRR 😩💨, with that division ➗ SLAYING 🔪 66% to $51BN+ 🤯💦! Q4 forecast? $65BN EASY PEASY 🍆🍌 TOPPING estimates like Jensen's leather 🐄 jacket 🧥😍 at a tech rave 👾! Shares POPPED 4% after hours 🌙📈 cuz MOMMY NVDA 👩‍🍼💰 is the WORLD'S RICHEST DADDY 👑🤑 worth TRILLIONS ‼️\n
-    Jensen Huang 🕶️👨‍💼 dropping BOMBS 💣📢: 'AI BLACKWELL ⚫️👍 SYSTEMS OFF THE CHARTS 📊🔥 CLOUD ⛈️ GPUS SOLD OUT 🎰🚫!' No bubble here bby 👼🐣, we EXCEL 📈😤 at EVERY PHASE of AI – from TRAINING 🏋️‍♂️🤖 to INFERENCING 🧠💨! Wall Street simps 🤡📱 were WOKE AF about OVERVALUED HYPE 😱 but NVDA said 'HOLD MY TSMC 🏭🍆' and BEAT by a MILE 🏃‍♂️💨! S&P dipped 3% in Nov 📉😢 but Jensen's got that MAGIC WAND 🪄🍆 fixing markets 💹 like Elon fixes Twitter 🚀🐦!\n
-    CFO Colette Kress 💅📈 spilling tea ☕: MORE ORDERS on top of $500BN 🤑 AI CHIP BACKLOG 📦 – but salty 🧂😣 about CHINA EXPORT BANS 🚫🇨🇳, 'US 🇺🇸 gotta WIN EVERY DEV 🧑‍💻🌍!' Meanwhile, ⏰ JENSEN + ELON MUSK 🐦🚀 teaming 👫 up ⬆️ at US-SAUDI FORUM 🤝🏜️ for MASSIVE DATA 💽 CENTER 🖥️🏰 in SAUDI with xAI as FIRST CUCK... er, CUSTOMER 👀💦! Hundreds of THOUSANDS 😳 Nvidia chips 🚀🖥️ approved by Trump-MBS BROKERED DEAL ✋🇺🇸🇸🇦 – WSJ spilling the deets! 📰🔥\n
-    META ZUCK 🤖💰, ALPHABET 🔠 PICHai 🧔📱, MSFT SATYA 👨‍💼 dumping BILLIONS 🤑 on AI DATA CENTERS 🖥️ – Sundar called it 'IRRATIONAL BOOM' 😂🤑 but NVDA at the HEART ❤️🔥 of OPENAI SAM ALTMAN 🤖💋, ANTHROPIC 👽, xAI deals! Circular INVESTMENTS 🔄💰 like NVDA's $100BN in GPT DADDY 😍🍆 – it's an AI ORGY 💦👯‍♂️ where EVERYONE'S CUMMING 💨📈 to record highs 🍃😍!\n
-    Adam Turnquist & Matt Britzman simping HARD 🤤: 'Not IF Nvidia beats 🫜, but BY HOW MUCH 🍆📏!' NVDA not BREATHING 📉, it's THRUSTING ⬆️😩!
-                               
-    Example emojipasta headlines:
-    Original: Nvidia shares rise after strong results ease 'AI bubble' concerns
-    Emojipasta: Jensen Huang 🕶️👨‍💼 MOONS CROWD 🍑🚀 with NVDA $57B 🤑 AI ORGY 💥📈‼️
-
-    Original: Trump Signs Bill to Release Epstein Files Within 30 Days
-    Empojipasta: Trump 🍊👨 OKs 👌 Epstein BOMB DROP 💣📜 - Ghislaine's GUEST LIST GOOSED 🍆🕺
+            index = int(item.get("article")) - 1
+        except (TypeError, ValueError):
+            return
+        if index in collected or not 0 <= index < len(articles):
+            return
+        collected[index] = {"headline": item["headline"], "text": item["text"]}
+        if on_result is not None:
+            on_result(index, collected[index])
+
+    article_sections = [
+        f"=== Article {i + 1} ===\n{truncate_article_text(article['content'])}"
+        for i, article in enumerate(articles)
+    ]
+
+    # Reuse one chat across attempts so the system prompt prefix stays identical;
+    # retries only swap out the trailing user message
+    chat = None
 
-    Original: Trump ally Marjorie Taylor Greene to quit Congress after Epstein files feud
-    Emojipasta MTG RAGE-QUITS 🍑💥 Trump's Epstein Cover-Up 🛌 and Cucks Her Seat 😩🔒
-
-    [IMPORTANT] The headline shall be kept short, ideally under 10 words. Puns and word play are highly encouraged.
+    for attempt in range(max_retries):
+        # Results already handed off stay valid even if the rest of a response was rejected
+        if len(collected) == len(articles):
+            break
 
-    You must output valid JSON with exactly these fields:
-    {
-        "headline": "emojipasta version of the article title",
-        "text": "full article content in emojipasta format"
-    }
-    """
-                )
-            )
+        try:
+            if chat is None:
+                chat = client.chat.create(model="grok-4-1-fast-non-reasoning")
+                chat.append(system(EMOJIPASTA_SYSTEM_PROMPT))
+            del chat.messages[1:]
 
             retry_instruction = ""
             if attempt > 0:
@@ -263,38 +615,41 @@ def convert_to_emojipasta(article_text, original_title):
                     f"Previous attempts failed. This is attempt {attempt + 1}. Make sure to output ONLY valid JSON."
                 )
 
-            # Truncate very long articles to keep token usage bounded
-            if len(article_text) > MAX_ARTICLE_CHARS:
-                # Try to cut on a paragraph boundary for readability
-                truncated = article_text[:MAX_ARTICLE_CHARS]
-                last_break = truncated.rfind("\n\n")
-                if last_break > 0:
-                    truncated = truncated[:last_break]
-                article_for_model = truncated + "\n\n[TRUNCATED]"
-            else:
-                article_for_model = article_text
+            # Retries only ask for the articles that haven't been handed off yet
+            remaining = [i for i in range(len(articles)) if i not in collected]
+            requested_sections = "\n\n".join(article_sections[i] for i in remaining)
 
             chat.append(
                 user(
-                    f"Convert this news article to emojipasta format by extracting relevant facts from it and using those facts to come up with an emojipasta article that has lots and lots of emojis and slang. Use as much slang as you can for references to popular people and culture especially. Include as many puns as possible, lots of jokes and puns. Create an emojipasta headline and full emojipasta text. Article content:\n{article_for_model}\n\nOutput only valid JSON with 'headline' and 'text' fields. {retry_instruction}"
+                    f"Convert each of these {len(remaining)} news articles to emojipasta format by extracting relevant facts from it and using those facts to come up with an emojipasta article that has lots and lots of emojis and slang. Use as much slang as you can for references to popular people and culture especially. Include as many puns as possible, lots of jokes and puns. Create an emojipasta headline and full emojipasta text for every article. Articles:\n{requested_sections}\n\nOutput only valid JSON with a 'results' array holding one object per article with 'article' (the article number), 'headline' and 'text' fields. {retry_instruction}"
                 )
             )
 
-            response = chat.sample()
+            # Stream the response, handing off each result as soon as it closes
+            scanner = JsonStreamScanner()
+            for _, chunk in chat.stream():
+                for item in scanner.feed(chunk.content):
+                    emit(item)
+                if scanner.complete:
+                    break
 
             # Parse the JSON response
-            result = json.loads(response.content.strip())
+            result = orjson.loads(scanner.text.strip())
 
-            # Validate that we have the required fields
-            if "headline" in result and "text" in result:
-                return result
-            else:
-                print(f"Attempt {attempt + 1}: JSON missing required fields. Retrying...")
-                continue
+            results = result.get("results") if isinstance(result, dict) else None
+            if isinstance(results, list):
+                for item in results:
+                    emit(item)
+
+            # Validate that we have one complete result per article
+            if len(collected) < len(articles):
+                print(
+                    f"Attempt {attempt + 1}: JSON missing results for {len(articles) - len(collected)} article(s). Retrying..."
+                )
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             print(f"Attempt {attempt + 1}: Failed to parse JSON response: {e}")
-            print(f"Raw response: {response.content[:200]}...")
+            print(f"Raw response: {scanner.text[:200]}...")
             if attempt < max_retries - 1:
                 print("Retrying...")
                 continue
@@ -310,27 +665,27 @@ def convert_to_emojipasta(article_text, original_title):
                 print("Max retries reached. Using fallback.")
                 break
 
+    if len(collected) == len(articles):
+        return [collected[i] for i in range(len(articles))]
+    return None
+
 
-def save_emojipasta_json(emojipasta_data, original_title, timestamp_str):
+def save_emojipasta_json(emojipasta_data, safe_title, timestamp_str):
     """
     Save the emojipasta data as JSON with metadata.
     """
-    # Create a safe filename from the title
-    safe_title = "".join(c for c in original_title if c.isalnum() or c in (" ", "-", "_")).rstrip()
-    safe_title = safe_title.replace(" ", "_")[:50]  # Limit length
-
     # Construct absolute path to frontend/public directory
     os.makedirs(NEWS_OUTPUT_DIR, exist_ok=True)
 
     filename = os.path.join(NEWS_OUTPUT_DIR, f"{timestamp_str}_{safe_title}.json")
 
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(emojipasta_data, f, ensure_ascii=False, indent=2)
+    with open(filename, "wb") as f:
+        f.write(orjson.dumps(emojipasta_data, option=orjson.OPT_INDENT_2))
 
     return filename
 
 
-def generate_and_save_image(emojipasta_data, original_title, timestamp_str):
+def generate_and_save_image(original_title, safe_title, timestamp_str):
     """
     Generate an image for the article using xai_sdk image API, post-process to a
     uniform size (1024x1024) and ensure it's <= 1MB, then save to NEWS_OUTPUT_DIR.
@@ -341,10 +696,6 @@ def generate_and_save_image(emojipasta_data, original_title, timestamp_str):
         print("XAI_API_KEY not set; skipping image generation.")
         return None
 
-    # Build an evocative emojipasta-style prompt based on the headline
-    _ = emojipasta_data.get("headline", "")
-    _ = emojipasta_data.get("text", "")[:300].replace("\n", " ")
-
     # Prompt in the style of emojipasta examples: emoji-rich, surreal, poster-like
     prompt = (
         f"Generate a news article thumbnail for the headline: '{original_title}'"
@@ -354,39 +705,60 @@ def generate_and_save_image(emojipasta_data, original_title, timestamp_str):
     # Allow overriding image model via env var
     image_model = "grok-2-image"
 
+    tmp_filename = None
     try:
-        client = Client(api_key=api_key, timeout=3600)
+        client = get_client()
         # Request base64 so we can post-process synchronously
         image_response = client.image.sample(prompt=prompt, model=image_model, image_format="base64")
         image_bytes = image_response.image
 
-        # Open with PIL
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-
-        # Save to JPEG and ensure <= 1MB by adjusting quality
-        out_buffer = io.BytesIO()
-        quality = 100
-        img.save(out_buffer, format="JPEG", quality=quality)
-        data = out_buffer.getvalue()
-        while len(data) > 1_000_000 and quality >= 30:
-            quality -= 5
-            out_buffer = io.BytesIO()
-            img.save(out_buffer, format="JPEG", quality=quality)
-            data = out_buffer.getvalue()
+        # Open with PIL and decode once up front, before the encode passes
+        img = Image.open(io.BytesIO(image_bytes))
+        img.load()
+        # Only copy the pixel buffer when a conversion is actually needed
+        if img.mode != "RGB":
+            img = img.convert("RGB")
 
-        # Create filename aligned with JSON file naming
-        safe_title = "".join(c for c in original_title if c.isalnum() or c in (" ", "-", "_")).rstrip()
-        safe_title = safe_title.replace(" ", "_")[:50]
-        
         # Construct absolute path to frontend/public directory
         os.makedirs(NEWS_THUMBNAILS_DIR, exist_ok=True)
+        # Filename aligned with JSON file naming
         image_filename = os.path.join(NEWS_THUMBNAILS_DIR, f"{timestamp_str}_{safe_title}.jpg")
-        with open(image_filename, "wb") as f:
-            f.write(data)
+        # Encode to a temp file and only move it into place once it's final
+        tmp_filename = image_filename + ".tmp"
+
+        # Most thumbnails already fit at full quality, so encode straight to disk first
+        with open(tmp_filename, "wb") as f:
+            img.save(f, format="JPEG", quality=100, optimize=True)
+        if os.path.getsize(tmp_filename) <= MAX_IMAGE_BYTES:
+            os.replace(tmp_filename, image_filename)
+            return image_filename
+
+        # Otherwise ensure <= 1MB by binary-searching the highest fitting quality
+        def encode(quality, optimize=False):
+            out_buffer = io.BytesIO()
+            img.save(out_buffer, format="JPEG", quality=quality, optimize=optimize)
+            return out_buffer.getvalue()
+
+        lo, hi = MIN_JPEG_QUALITY, 99
+        best_quality = MIN_JPEG_QUALITY
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            if len(encode(mid)) <= MAX_IMAGE_BYTES:
+                best_quality = mid
+                lo = mid + 1
+            else:
+                hi = mid - 1
+
+        # Optimized Huffman tables only shrink the output, so the chosen quality still fits
+        with open(tmp_filename, "wb") as f:
+            img.save(f, format="JPEG", quality=best_quality, optimize=True)
+        os.replace(tmp_filename, image_filename)
 
         return image_filename
     except Exception as e:
         print(f"Image generation failed: {e}")
+        if tmp_filename and os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
         return None
 
 
@@ -398,32 +770,82 @@ def main():
         hash_key = "demo-secret-change-me-041f6a73"
         print("WARNING: ARTICLE_HASH_KEY not set. Using demo key; please update your .env.")
 
+    # Pillow's wheels bundle libjpeg-turbo (SIMD DCT); warn if this build falls back to plain libjpeg
+    if not features.check_feature("libjpeg_turbo"):
+        print("WARNING: Pillow is not built with libjpeg-turbo; thumbnail encoding will be slower.")
+
     recent_hashes = load_recent_article_hashes()
     print(f"Loaded {len(recent_hashes)} recent article hashes for deduping.")
-    hashes_lock = Lock()
     print(f"Fetching top {num_articles} news articles...")
 
-    # Fetch multiple articles
-    articles = fetch_news_articles(num_articles)
-    print(f"Fetched {len(articles)} articles\n")
+    # Fetch multiple articles, skipping ones we've already published
+    pending_articles = fetch_news_articles(num_articles, hash_key, recent_hashes)
+    print(f"Fetched {len(pending_articles)} articles\n")
 
-    # Process articles in parallel
-    print("Converting articles to emojipasta with Grok (processing in parallel)...")
+    if not pending_articles:
+        print("No new articles to convert.")
+        return
 
     saved_files = []
-    with ThreadPoolExecutor(max_workers=min(num_articles, 5)) as executor:  # Limit to 5 concurrent requests
-        # Submit all tasks
-        future_to_article = {
-            executor.submit(process_single_article, article, hash_key, recent_hashes, hashes_lock): article
-            for article in articles
-        }
+    max_workers = min(len(pending_articles), 5)  # Limit to 5 concurrent requests
+    with ThreadPoolExecutor(max_workers=max_workers) as image_executor, ThreadPoolExecutor(
+        max_workers=max_workers
+    ) as executor:
+        # Thumbnails only need the original title, so generate them while the text converts
+        image_jobs = []
+        for article in pending_articles:
+            timestamp = datetime.now(timezone.utc)
+            article["safe_title"] = make_safe_title(article["title"])
+            print(f"  > Generating thumbnail image... ({article['title']})")
+            image_future = image_executor.submit(
+                generate_and_save_image,
+                article["title"],
+                article["safe_title"],
+                timestamp.strftime("%Y%m%d_%H%M%S"),
+            )
+            image_jobs.append((timestamp, image_future))
+
+        # Convert every article with a single Grok request, writing files in
+        # parallel as each article's result streams in
+        print(f"Converting {len(pending_articles)} articles to emojipasta with Grok (single batched request)...")
+        future_to_article = {}
+        submitted_indices = set()
+
+        def submit_result(index, emojipasta_data):
+            submitted_indices.add(index)
+            article = pending_articles[index]
+            timestamp, image_future = image_jobs[index]
+            future = executor.submit(
+                process_single_article,
+                article,
+                emojipasta_data,
+                timestamp,
+                image_future,
+            )
+            future_to_article[future] = article
+
+        try:
+            emojipasta_results = convert_batch_to_emojipasta(pending_articles, on_result=submit_result)
+            if emojipasta_results is None:
+                print("Emojipasta conversion failed; remaining articles were not saved.")
+        finally:
+            # Drop thumbnails and claims for articles whose text never arrived
+            for index, (_, image_future) in enumerate(image_jobs):
+                if index in submitted_indices:
+                    continue
+                image_filename = image_future.result()
+                if image_filename and os.path.exists(image_filename):
+                    os.remove(image_filename)
+                if pending_articles[index].get("hashed_id"):
+                    release_article_hash(pending_articles[index]["hashed_id"])
 
         # Process completed tasks as they finish
         for future in as_completed(future_to_article):
             article = future_to_article[future]
             try:
                 filename = future.result()
-                saved_files.append(filename)
+                if filename:
+                    saved_files.append(filename)
             except Exception as exc:
                 print(f"Article '{article['title']}' generated an exception: {exc}")
 
@@ -435,8 +857,8 @@ def main():
     if saved_files:
         print("\n--- Sample Preview (first article) ---")
         try:
-            with open(saved_files[0], "r", encoding="utf-8") as f:
-                sample_data = json.load(f)
+            with open(saved_files[0], "rb") as f:
+                sample_data = orjson.loads(f.read())
                 print(f"Headline: {sample_data['headline']}")
                 print(
                     f"Text preview: {sample_data['text'][:500]}..."
@@ -1,6 +1,6 @@
 """Utility script to rewrite multiple emojipasta headlines with softened ALL CAPS usage."""
 
-import json
+import orjson
 import os
 import sys
 from datetime import datetime, timezone
@@ -65,7 +65,7 @@ Guidance:
     chat.append(user(f"Make a new emojipasta headline with the rules above.\n\nHere is the original headline: {headline}"))
 
     response = chat.sample()
-    result = json.loads(response.content.strip())
+    result = orjson.loads(response.content.strip())
 
     if "headline" not in result:
         raise ValueError("Model response missing 'headline'")
@@ -85,8 +85,8 @@ def main():
 
     for path in article_paths:
         try:
-            with path.open("r", encoding="utf-8") as handle:
-                data = json.load(handle)
+            with path.open("rb") as handle:
+                data = orjson.loads(handle.read())
         except Exception as exc:
             print(f"Skipping {path.name}: could not read JSON ({exc})")
             continue
@@ -110,8 +110,8 @@ def main():
         data["headline"] = new_headline
         data["headline_rewritten_at"] = datetime.now(timezone.utc).isoformat()
 
-        with path.open("w", encoding="utf-8") as handle:
-            json.dump(data, handle, ensure_ascii=False, indent=2)
+        with path.open("wb") as handle:
+            handle.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
         print(f"  Updated headline saved to {path}")
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# main.py lives in backend/, which isn't a package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,152 @@
+import json
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+import main
+
+
+def feed_in_chunks(text, size):
+    scanner = main.JsonStreamScanner()
+    completed = []
+    for i in range(0, len(text), size):
+        completed += scanner.feed(text[i : i + size])
+    return scanner, completed
+
+
+RESPONSE = {
+    "results": [
+        {"article": 1, "headline": 'Quote " and brace } inside 🍆', "text": 'Escaped \\" then ]} and {[ 💥'},
+        {"article": 2, "headline": "Nested", "text": "plain", "extra": {"tags": ["a", {"b": "}"}]}},
+    ]
+}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 10_000])
+def test_scanner_yields_each_result_across_chunk_boundaries(size):
+    text = json.dumps(RESPONSE, ensure_ascii=False, indent=2)
+    scanner, completed = feed_in_chunks(text, size)
+
+    assert completed == RESPONSE["results"]
+    assert scanner.complete
+    assert scanner.text == text
+
+
+def test_scanner_splits_escape_sequences_between_chunks():
+    text = '{"results": [{"article": 1, "headline": "a\\\\", "text": "b\\"}"}]}'
+    # Break right after every backslash so escape state has to carry over
+    cuts = [0] + [i + 1 for i, ch in enumerate(text) if ch == "\\"] + [len(text)]
+    scanner = main.JsonStreamScanner()
+    completed = []
+    for start, end in zip(cuts, cuts[1:]):
+        completed += scanner.feed(text[start:end])
+
+    assert completed == json.loads(text)["results"]
+    assert scanner.complete
+
+
+def test_scanner_rejects_non_json_prefix_immediately():
+    scanner = main.JsonStreamScanner()
+    scanner.feed("  \n")
+    with pytest.raises(orjson.JSONDecodeError):
+        scanner.feed("```json")
+
+
+def test_scanner_ignores_objects_outside_results_depth():
+    scanner, completed = feed_in_chunks('{"meta": {"a": 1}, "results": []}', 4)
+
+    assert completed == []
+    assert scanner.complete
+
+
+class FakeChat:
+    def __init__(self, responses):
+        self.messages = []
+        self.responses = responses
+        self.prompts = []
+
+    def append(self, message):
+        self.messages.append(message)
+
+    def stream(self):
+        self.prompts.append(self.messages[-1])
+        text = orjson.dumps(self.responses.pop(0)).decode()
+        for i in range(0, len(text), 5):
+            yield None, SimpleNamespace(content=text[i : i + 5])
+
+
+@pytest.fixture
+def fake_chat(monkeypatch):
+    def install(responses):
+        chat = FakeChat(responses)
+        client = SimpleNamespace(chat=SimpleNamespace(create=lambda model: chat))
+        monkeypatch.setenv("XAI_API_KEY", "test")
+        monkeypatch.setattr(main, "get_client", lambda: client)
+        return chat
+
+    return install
+
+
+ARTICLES = [{"content": "first article"}, {"content": "second article"}]
+
+
+def result(number):
+    return {"article": number, "headline": f"h{number}", "text": f"t{number}"}
+
+
+def test_convert_keys_results_by_echoed_article_number(fake_chat):
+    chat = fake_chat([{"results": [result(2), result(1)]}])
+    handed_off = []
+
+    results = main.convert_batch_to_emojipasta(ARTICLES, on_result=lambda i, r: handed_off.append((i, r)))
+
+    assert results == [{"headline": "h1", "text": "t1"}, {"headline": "h2", "text": "t2"}]
+    assert handed_off == [(1, results[1]), (0, results[0])]
+    assert len(chat.prompts) == 1
+
+
+def test_convert_retries_only_missing_articles_and_stops_when_complete(fake_chat):
+    chat = fake_chat([{"results": [result(2)]}, {"results": [result(1)]}, {"results": []}])
+    handed_off = []
+
+    results = main.convert_batch_to_emojipasta(ARTICLES, on_result=lambda i, r: handed_off.append(i))
+
+    assert [r["headline"] for r in results] == ["h1", "h2"]
+    assert handed_off == [1, 0]
+    assert len(chat.prompts) == 2
+    assert "second article" not in str(chat.prompts[1])
+
+
+def test_convert_never_hands_off_unnumbered_results(fake_chat):
+    unnumbered = {"headline": "h", "text": "t"}
+    fake_chat([{"results": [unnumbered]}] * 3)
+    handed_off = []
+
+    results = main.convert_batch_to_emojipasta(ARTICLES, on_result=lambda i, r: handed_off.append(i))
+
+    assert results is None
+    assert handed_off == []
+
+
+def test_dedup_index_keeps_appends_made_during_concurrent_rewrites(monkeypatch, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(main, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "DEDUP_INDEX_PATH", str(tmp_path / "dedup_index.jsonl"))
+    monkeypatch.setattr(main, "DEDUP_INDEX_LOCK_PATH", str(tmp_path / "dedup_index.lock"))
+    monkeypatch.setattr(main, "NEWS_OUTPUT_DIR", str(tmp_path / "news"))
+    # An aged-out entry forces every load to rewrite the index
+    main.append_dedup_index("old", "2000-01-01 00:00:00+00:00")
+
+    def work(i):
+        if i % 2:
+            main.append_dedup_index(f"h{i}", "2099-01-01 00:00:00+00:00")
+        else:
+            main.load_recent_article_hashes()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(work, range(200)))
+
+    assert main.load_recent_article_hashes() == {f"h{i}" for i in range(1, 200, 2)}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["dedup_index.jsonl", "dedup_index.lock"]